@@ -2,12 +2,21 @@
 Base App
 
 """
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import bisect
+import functools
+import itertools
 import logging
+import multiprocessing
+import queue
 from dotenv import load_dotenv
-import json
-from transformers import pipeline
+import orjson
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import sqlite3
 import os
+import re
+import threading
 from enum import Enum
 
 class Theme(Enum):
@@ -21,6 +30,62 @@ class Theme(Enum):
     SPACEFLIGHT = 'spaceflight'
 
 THRESHOLD_CLASSIFICATION_DEFAULT = 0.7  # initial guess; adjust as needed
+CLASSIFY_BATCH_SIZE = 32  # sequences per model forward pass
+INSERT_CHUNK_SIZE = 1000  # classified rows per background db write
+CLASSIFY_SHARD_SIZE = 256  # tweets per task when classifying in worker processes
+# smaller and faster than facebook/bart-large-mnli, and more accurate on MNLI;
+# override with the CLASSIFIER_MODEL environment variable
+CLASSIFIER_MODEL_DEFAULT = "MoritzLaurer/DeBERTa-v3-base-mnli"
+# the only model scores were computed with before the model was stored per row
+CLASSIFIER_MODEL_LEGACY = "facebook/bart-large-mnli"
+HYPOTHESIS_TEMPLATE = "This example is {}."  # same as the zero-shot pipeline's
+DB_PATH = "theme_classifications.db"
+
+# Cheap recall-oriented first stage: for these themes only tweets matching the
+# pattern go to the model at all. The rest are recorded in keyword_rejections
+# along with the pattern text, not in scores, so editing a pattern makes them
+# candidates again. Broad themes (entertainment, technology, ...) have no
+# pattern, as a keyword list would miss too many real matches; every tweet is
+# scored for them.
+THEME_KEYWORDS = {
+    Theme.MIAMI.value: re.compile(
+        r"\b(miami|dade|brickell|wynwood|south beach|little havana|coconut grove"
+        r"|coral gables|key biscayne|florida|305)\b",
+        re.IGNORECASE,
+    ),
+    Theme.EUROPE.value: re.compile(
+        r"\b(europe\w*|eu|eurozone|euro|brussels|paris|berlin|london|madrid|rome"
+        r"|amsterdam|france|french|germany|german\w*|spain|spanish|italy|italian"
+        r"|netherlands|dutch|belgi\w+|poland|polish|ukrain\w*|greece|greek|portugal"
+        r"|swed\w+|norw\w+|denmark|danish|finland|finnish|austria\w*|swiss"
+        r"|switzerland|ireland|irish|uk|britain|british|brexit|nato|kyiv|kiev"
+        r"|vienna|prague|warsaw|dublin|lisbon|budapest|athens|stockholm|oslo"
+        r"|copenhagen|helsinki)\b",
+        re.IGNORECASE,
+    ),
+    Theme.SPACEFLIGHT.value: re.compile(
+        r"\b(space\w*|rocket\w*|nasa|spacex|starship|falcon|launch\w*|orbit\w*"
+        r"|astronaut\w*|iss|moon|lunar|mars|satellite\w*|esa|blue origin|artemis"
+        r"|apollo|shuttle|booster\w*)\b",
+        re.IGNORECASE,
+    ),
+}
+
+
+def _connect(database: str, **kwargs) -> sqlite3.Connection:
+    """
+    sqlite3.connect plus the per-connection pragmas every connection to the
+    classifications db should run with (they reset on each new connection).
+    """
+    conn = sqlite3.connect(database, **kwargs)
+    # with WAL (set once, persistently, in init) synchronous=NORMAL commits
+    # no longer fsync every time
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    return conn
+
 
 def init():
     load_dotenv()
@@ -29,38 +94,138 @@ def init():
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
     logger_data = logging.getLogger('data_warnings')
-    handler = logging.FileHandler('logs/data_warnings.log')
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger_data.addHandler(handler)
+    # init() may run more than once per process: one file handler is enough
+    if not any(isinstance(h, logging.FileHandler) for h in logger_data.handlers):
+        handler = logging.FileHandler('logs/data_warnings.log')
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        handler.setFormatter(formatter)
+        logger_data.addHandler(handler)
     logger_data.setLevel(logging.WARNING)
     
     logging.info("Initializing application")
     logging.info("Configured logging.")
     logging.info("Set environment variables.")
 
-    conn = sqlite3.connect("theme_classifications.db")
+    # check_same_thread=False: classify_and_save hands the connection to its
+    # writer thread while the main thread is classifying (never both at once)
+    conn = _connect(DB_PATH, check_same_thread=False)
+    # WAL: readers don't block the writer. Stored in the db file, so it only
+    # needs setting here. Creates theme_classifications.db-wal/-shm.
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
+    # one explicit transaction for all of the schema work below: sqlite3 does
+    # not open one implicitly for DDL, so without it a crash mid-migration
+    # would leave an empty new scores table and the old rows in scores_legacy
+    cursor.execute("BEGIN")
+
+    # older databases are keyed on tweet_id only (one theme per tweet) or on
+    # (tweet_id, theme) (no record of the model): rebuild them in the current
+    # layout. Scores from different models are not comparable, so the model
+    # is part of the key.
+    cursor.execute("PRAGMA table_info(scores)")
+    scores_key = [
+        row[1] for row in sorted(cursor.fetchall(), key=lambda row: row[5]) if row[5]
+    ]
+    legacy_scores = bool(scores_key) and scores_key != ["tweet_id", "theme", "model"]
+    if legacy_scores:
+        cursor.execute("ALTER TABLE scores RENAME TO scores_legacy")
 
+    # WITHOUT ROWID: rows live in the primary key b-tree itself, so there is
+    # no separate rowid table plus key index to store and keep in sync
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS scores (
-            tweet_id TEXT PRIMARY KEY,
+            tweet_id TEXT NOT NULL,
             full_text TEXT NOT NULL,
             theme TEXT NOT NULL,
-            score REAL NOT NULL
+            score REAL NOT NULL,
+            model TEXT NOT NULL,
+            PRIMARY KEY (tweet_id, theme, model)
+        ) WITHOUT ROWID
+        """
+    )
+
+    if legacy_scores:
+        cursor.execute(
+            "INSERT OR IGNORE INTO scores (tweet_id, full_text, theme, score, model) "
+            "SELECT tweet_id, full_text, theme, score, ? FROM scores_legacy",
+            (CLASSIFIER_MODEL_LEGACY,),
         )
+        cursor.execute("DROP TABLE scores_legacy")
+        logging.info(
+            "Migrated scores table to a (tweet_id, theme, model) primary key; "
+            f"existing scores are attributed to {CLASSIFIER_MODEL_LEGACY}."
+        )
+
+    # fetch_tweets_for_theme: range scan on score within one (theme, model),
+    # already in score order, so no sort. Lookups of single pairs (skipping
+    # already-classified ones) go through the primary key.
+    cursor.execute("DROP INDEX IF EXISTS idx_theme")
+    cursor.execute("DROP INDEX IF EXISTS idx_theme_tweet_id")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_theme_model_score ON scores (theme, model, score)"
+    )
+
+    # tweets the keyword prefilter kept from the model, per theme, with the
+    # pattern that rejected them (see THEME_KEYWORDS)
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS keyword_rejections (
+            tweet_id TEXT NOT NULL,
+            theme TEXT NOT NULL,
+            pattern TEXT NOT NULL,
+            PRIMARY KEY (tweet_id, theme)
+        ) WITHOUT ROWID
         """
     )
 
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweet_id ON scores (tweet_id)")
-    # fetch already-classified's by theme: don't perform duplicate work
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_theme ON scores (theme)")
+    # row counts kept up to date by triggers, so display_db doesn't have to
+    # scan the whole table; seeded with one COUNT(*) the first time
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meta (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        "INSERT OR IGNORE INTO meta (table_name, row_count) "
+        "SELECT 'scores', COUNT(*) FROM scores"
+    )
+    if legacy_scores:
+        # the copy ran before the triggers below exist on the new table
+        cursor.execute(
+            "UPDATE meta SET row_count = (SELECT COUNT(*) FROM scores) "
+            "WHERE table_name = 'scores'"
+        )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS scores_count_insert AFTER INSERT ON scores
+        BEGIN
+            UPDATE meta SET row_count = row_count + 1 WHERE table_name = 'scores';
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS scores_count_delete AFTER DELETE ON scores
+        BEGIN
+            UPDATE meta SET row_count = row_count - 1 WHERE table_name = 'scores';
+        END
+        """
+    )
 
     conn.commit()
     logging.info(
         "Initialized SQLite database and created necessary table and index(es)."
     )
+
+    # with worker processes each loads its own copy; a parent copy would only
+    # take up memory
+    if int(os.getenv("CLASSIFY_WORKERS", "1")) <= 1:
+        _get_classifier()
+        logging.info("Loaded zero-shot classifier.")
     return conn
 
 def terminate(conn: sqlite3.Connection) -> None:
@@ -68,6 +233,12 @@ def terminate(conn: sqlite3.Connection) -> None:
     Clean up resources and gracefully terminate the application.
     """
     if conn:
+        # refresh sqlite_stat1 for the scores indexes if it has gone stale;
+        # a no-op (and cheap) when nothing changed enough to matter
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            logging.error(f"Database error: {e}")
         conn.close()
         logging.info("Database connection closed.")
     logging.info("Application terminated.")
@@ -77,6 +248,12 @@ def display_db(conn: sqlite3):
 
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = cursor.fetchall()
+    # all trigger-maintained counts in one round trip, not one query per table;
+    # a db that init() has not upgraded yet has no meta table
+    row_counts = {}
+    if ("meta",) in tables:
+        cursor.execute("SELECT table_name, row_count FROM meta")
+        row_counts = dict(cursor.fetchall())
 
     for table_name in tables:
         table_name = table_name[0]
@@ -88,9 +265,11 @@ def display_db(conn: sqlite3):
         column_names = [column[1] for column in columns]
         logging.info(f"Columns: {column_names}")
 
-        # Count the rows in the table
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
-        count = cursor.fetchone()[0]
+        # Count the rows in the table: trigger-maintained if available
+        count = row_counts.get(table_name)
+        if count is None:
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+            count = cursor.fetchone()[0]
         logging.info(f"Row count: {count}\n")
 
 
@@ -108,8 +287,9 @@ def fetchTweets():
         },
     ]
     """
-    with open("twitter-personal-archive/tweets.json", "r") as file:
-        tweets = json.load(file)
+    # orjson parses straight from bytes in C, several times faster than json
+    with open("twitter-personal-archive/tweets.json", "rb") as file:
+        tweets = orjson.loads(file.read())
     return tweets["tweets"]
 
 
@@ -135,86 +315,478 @@ def fetchTweets():
 #     pass
 
 
-def fetch_classified_tweet_ids(conn: sqlite3, theme: str) -> set:
+def fetch_tweets_for_theme(
+    conn: sqlite3,
+    theme: str,
+    threshold: float = THRESHOLD_CLASSIFICATION_DEFAULT,
+    model: str = None,
+) -> list:
+    """
+    Returns [(tweet_id, full_text, score), ...] for tweets scored at or above
+    `threshold` for `theme` by `model` (default: the current classifier, see
+    classifier_name), highest score first.
+    """
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT tweet_id FROM scores WHERE theme = ?", (theme,))
-        existing_ids = set(row[0] for row in cursor.fetchall())
-        return existing_ids
+        cursor.execute(
+            "SELECT tweet_id, full_text, score FROM scores "
+            "WHERE theme = ? AND model = ? AND score >= ? ORDER BY score DESC",
+            (theme, model or classifier_name(), threshold),
+        )
+        return cursor.fetchall()
     except sqlite3.Error as e:
         logging.error(f"Database error: {e}")
-        return set()
+        return []
+
+
+def classifier_name() -> str:
+    """
+    Identifies the classifier the current settings load (see _get_classifier);
+    stored with every score, as scores from different models, or from the
+    quantized ONNX export of a model, are not comparable.
+    """
+    model_name = os.getenv("CLASSIFIER_MODEL", CLASSIFIER_MODEL_DEFAULT)
+    onnx_dir = os.getenv("CLASSIFIER_ONNX_DIR")
+    if onnx_dir:
+        return f"{model_name} (onnx: {os.path.basename(os.path.normpath(onnx_dir))})"
+    return model_name
+
+
+@functools.lru_cache(maxsize=1)
+def _get_classifier():
+    """
+    Load the NLI model and its tokenizer once per process; loading the model
+    weights costs far more than classifying a batch, so every caller shares it.
+    Returns (tokenizer, model, [contradiction label id, entailment label id]).
+    """
+    model_name = os.getenv("CLASSIFIER_MODEL", CLASSIFIER_MODEL_DEFAULT)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    onnx_dir = os.getenv("CLASSIFIER_ONNX_DIR")
+    if onnx_dir:
+        # int8-quantized ONNX export of the same model (see README); on CPU
+        # ONNX Runtime's integer kernels are several times faster than fp32
+        # torch. optimum is only needed for this path, hence the local import.
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        model = ORTModelForSequenceClassification.from_pretrained(onnx_dir)
+    else:
+        # first CUDA device when there is one; half precision halves the
+        # memory traffic there, while on CPU fp16 is slower than fp32
+        on_gpu = torch.cuda.is_available()
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_name, torch_dtype=torch.float16 if on_gpu else torch.float32
+        )
+        model.to("cuda" if on_gpu else "cpu")
+        model.eval()
 
+    label_ids = {label.lower(): i for i, label in model.config.id2label.items()}
+    nli_label_ids = [
+        next(i for label, i in label_ids.items() if label.startswith("contradiction")),
+        next(i for label, i in label_ids.items() if label.startswith("entailment")),
+    ]
+    return tokenizer, model, nli_label_ids
 
-def classify_tweets(tweets: list, theme: str) -> list:
-    classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-    classified_tweets = []
 
-    logging.info(f"Classifying {len(tweets)} tweets for theme '{theme}'")
-    count = 0
+@torch.inference_mode()
+def _entailment_scores(
+    tokenizer, model, nli_label_ids: list, premises: list, hypothesis: str
+) -> list:
+    """
+    Returns, per premise, P(entailment) against P(contradiction) for the one
+    hypothesis; the same score the zero-shot pipeline gives with multi_label.
+    The whole batch goes through one (Rust, for fast tokenizers) tokenizer
+    call, which pairs, truncates and pads it in one go.
+    Runs under inference_mode: no autograd bookkeeping (version counters,
+    view tracking) for any tensor created here, not just in the forward pass.
+    """
+    inputs = tokenizer(
+        premises,
+        [hypothesis] * len(premises),
+        truncation="only_first",
+        padding=True,
+        return_tensors="pt",
+    ).to(model.device)
+    logits = model(**inputs).logits
+    return logits[:, nli_label_ids].float().softmax(dim=-1)[:, 1].tolist()
+
+
+def _extract_texts(tweets: list) -> tuple:
+    """
+    One pass over the archive objects into parallel (tweet_ids, full_texts)
+    lists. Malformed objects are counted and reported once, to data_warnings.
+    """
+    tweet_ids, full_texts = [], []
+    no_tweet_count = no_id_count = no_text_count = 0
     for tw_obj in tweets:
-        count += 1
-        if count % 100 == 0:
-            logging.info(f"Classified {count} out of {len(tweets)} tweets.")
-        tweet = tw_obj.get("tweet", "")
+        tweet = tw_obj.get("tweet")
         if not tweet:
-            logger_data.warn('object found with no tweet')
+            no_tweet_count += 1
             continue
-        full_text = tweet.get("full_text", "")
-        tweet_id = tweet.get("id", "")
+        tweet_id = tweet.get("id")
         if not tweet_id:
-            logger_data.warn('tweet found with no id')
+            no_id_count += 1
             continue
+        full_text = tweet.get("full_text")
         if not full_text:
-            logger_data.warn(f'tweet has no full_text [(id{tweet_id})]')
+            no_text_count += 1
             continue
-        classification = classifier(full_text, theme)
-        # print(f'\033[95mClassified tweet full text {full_text} for theme {theme}: {classification}\033[0m')
-        scores_by_theme = dict(zip(classification["labels"], classification["scores"]))
-        classification_score = scores_by_theme.get(theme, 0)
-        if not classification_score:
-            logger_data.warn(f'no score found for theme {theme} after classification (tweet_id [{tweet_id}])')
-            continue
-        classified = {
-            "tweet_id": tweet_id,
-            "tweet_full_text": full_text,
-            "theme_measured": theme,
-            "classification_score": classification_score,
-        }
-        classified_tweets.append(classified)
-    return classified_tweets
+        tweet_ids.append(tweet_id)
+        full_texts.append(full_text)
+
+    if no_tweet_count or no_id_count or no_text_count:
+        logging.getLogger("data_warnings").warning(
+            f"Skipped {no_tweet_count} objects with no tweet, "
+            f"{no_id_count} tweets with no id, "
+            f"{no_text_count} tweets with no full_text"
+        )
+    return tweet_ids, full_texts
 
-def insert_classified_tweets(conn: sqlite3.Connection, classified_tweets: list) -> int:
-    cursor = conn.cursor()
-    rows_affected = 0
-    for tweet in classified_tweets:
-        try:
-            cursor.execute(
-                "INSERT INTO scores (tweet_id, full_text, theme, score) VALUES (?, ?, ?, ?)",
-                (
-                    tweet["tweet_id"],
-                    tweet["tweet_full_text"],
-                    tweet["theme_measured"],
-                    tweet["classification_score"],
-                ),
+
+def _iter_scored(tweet_ids: list, full_texts: list, work: dict):
+    """
+    Runs the model over `work`, {theme: [indices into tweet_ids/full_texts]},
+    and yields the scored rows one model batch at a time. Does no logging of
+    its own, as it also runs once per shard in the worker processes.
+    """
+    tokenizer, model, nli_label_ids = _get_classifier()
+    for theme, indices in work.items():
+        # order by text length (a cheap stand-in for token count) so each batch
+        # is padded to a similar length instead of to the longest tweet in a
+        # random mix; rows carry their ids, so nothing needs to be un-sorted
+        indices = sorted(indices, key=lambda i: len(full_texts[i]))
+        for start in range(0, len(indices), CLASSIFY_BATCH_SIZE):
+            batch = indices[start : start + CLASSIFY_BATCH_SIZE]
+            scores = _entailment_scores(
+                tokenizer,
+                model,
+                nli_label_ids,
+                [full_texts[i] for i in batch],
+                HYPOTHESIS_TEMPLATE.format(theme),
             )
-            rows_affected += cursor.rowcount
-            logging.info(f"Successfully inserted tweet_id: {tweet['tweet_id']} into the database.")
-        except sqlite3.Error as e:
-            logging.error(f"Failed to insert tweet_id: {tweet['tweet_id']} into the database. Error: {e}")
-    conn.commit()
+            yield [
+                {
+                    "tweet_id": tweet_ids[i],
+                    "tweet_full_text": full_texts[i],
+                    "theme_measured": theme,
+                    "classification_score": classification_score,
+                }
+                for i, classification_score in zip(batch, scores)
+            ]
+
+
+def _score_shard(tweet_ids: list, full_texts: list, work: dict) -> list:
+    # worker process entry point: one list of rows per shard
+    return [row for batch in _iter_scored(tweet_ids, full_texts, work) for row in batch]
+
+
+def insert_classified_tweets(
+    conn: sqlite3.Connection, classified_tweets: list, model: str
+) -> int:
+    """
+    Stores model scores in scores, attributed to `model` (see
+    classifier_name), and keyword prefilter rejections (rows with a
+    "keyword_pattern" instead of a score) in keyword_rejections.
+    On a database error the chunk is rolled back and the error re-raised, so
+    classify_and_save stops instead of scoring rows it cannot store.
+    """
+    rows = [
+        (
+            tweet["tweet_id"],
+            tweet["tweet_full_text"],
+            tweet["theme_measured"],
+            tweet["classification_score"],
+            model,
+        )
+        for tweet in classified_tweets
+        if "keyword_pattern" not in tweet
+    ]
+    rejections = [
+        (tweet["tweet_id"], tweet["theme_measured"], tweet["keyword_pattern"])
+        for tweet in classified_tweets
+        if "keyword_pattern" in tweet
+    ]
+    rows_affected = 0
+    cursor = conn.cursor()
+    try:
+        # one prepared statement for all rows, committed as a single transaction;
+        # OR IGNORE skips rows that are already stored instead of failing on them
+        cursor.executemany(
+            "INSERT OR IGNORE INTO scores (tweet_id, full_text, theme, score, model) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        rows_affected += cursor.rowcount
+        # OR REPLACE: a rejection under an older pattern is superseded
+        cursor.executemany(
+            "INSERT OR REPLACE INTO keyword_rejections (tweet_id, theme, pattern) VALUES (?, ?, ?)",
+            rejections,
+        )
+        rows_affected += cursor.rowcount
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(
+            f"Failed to insert {len(classified_tweets)} classified tweets into the database. Error: {e}"
+        )
+        raise
+    # debug with %-args: at the default INFO level the message isn't even
+    # formatted; classify_and_save logs one total for the whole run
+    logging.debug(
+        "Inserted %d of %d classified tweets into the database.",
+        rows_affected,
+        len(classified_tweets),
+    )
     return rows_affected
 
-def classify_and_save(conn: sqlite3, tweets: list, theme: str) -> int:
-    existing_ids: set = fetch_classified_tweet_ids(conn, theme)
-    # logging.info(f"Number of existing scored tweets IDs: {len(existing_ids)}")
-    
-    # logging.info(f'Number of existing IDs: {len(existing_ids)}')
-    tweets_not_yet_classified = [t for t in tweets if t['tweet'].get('id', '') not in existing_ids]
-    # logging.info(f'\033[94mNumber of tweets not yet clasified: {len(tweets_not_yet_classified)}\033[0m')
-    classified_tweets: list = classify_tweets(tweets_not_yet_classified, theme)
-    
-    rows_inserted = insert_classified_tweets(conn, classified_tweets)
+
+def fetch_unclassified_pairs(
+    conn: sqlite3, tweets: list, themes: list, model: str
+) -> dict:
+    """
+    Returns {theme: set of tweet ids with no stored score by `model` for that
+    theme}.
+    A keyword rejection counts as stored only while the theme's pattern is
+    unchanged. The set difference runs in SQLite: candidate ids go into a temp
+    table, and each (tweet_id, theme) pair is looked up on the table keys.
+    """
+    cursor = conn.cursor()
+    missing = {theme: set() for theme in themes}
+    try:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS candidates (idx INTEGER PRIMARY KEY, tweet_id TEXT)"
+        )
+        cursor.execute("DELETE FROM candidates")
+        cursor.executemany(
+            "INSERT INTO candidates (idx, tweet_id) VALUES (?, ?)",
+            ((i, t.get("tweet", {}).get("id", "")) for i, t in enumerate(tweets)),
+        )
+        theme_values = ", ".join("(?, ?)" for _ in themes)
+        theme_patterns = [
+            value
+            for theme in themes
+            for value in (theme, getattr(THEME_KEYWORDS.get(theme), "pattern", None))
+        ]
+        cursor.execute(
+            f"""
+            WITH wanted (theme, pattern) AS (VALUES {theme_values})
+            SELECT c.tweet_id, w.theme FROM candidates AS c CROSS JOIN wanted AS w
+            WHERE NOT EXISTS (
+                SELECT 1 FROM scores AS s
+                WHERE s.tweet_id = c.tweet_id AND s.theme = w.theme
+                AND s.model = ?
+            ) AND NOT EXISTS (
+                SELECT 1 FROM keyword_rejections AS k
+                WHERE k.tweet_id = c.tweet_id AND k.theme = w.theme
+                AND k.pattern = w.pattern
+            )
+            """,
+            [*theme_patterns, model],
+        )
+        for tweet_id, theme in cursor:
+            missing[theme].add(tweet_id)
+        cursor.execute("DELETE FROM candidates")
+        conn.commit()
+        return missing
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Database error: {e}")
+        all_ids = {t.get("tweet", {}).get("id", "") for t in tweets}
+        return {theme: set(all_ids) for theme in themes}
+
+
+def _init_classify_worker(torch_threads: int) -> None:
+    """
+    ProcessPoolExecutor initializer: split the cores between the workers and
+    load the model once per worker process rather than once per shard.
+    """
+    torch.set_num_threads(torch_threads)
+    _get_classifier()
+
+
+def _iter_sharded(tweet_ids: list, full_texts: list, work: dict, workers: int):
+    """
+    Scores `work` (see _iter_scored) in `workers` processes, in shards of
+    CLASSIFY_SHARD_SIZE tweets, each with its own copy of the model (so
+    `workers` times the memory). Shards are yielded in the order they
+    complete, and only a few per worker are in flight at a time, so finished
+    rows reach the caller steadily instead of all at the end.
+    """
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    logging.info(
+        f"Classifying in {workers} worker processes, {torch_threads} torch thread(s) each"
+    )
+
+    def shard_args():
+        for start in range(0, len(tweet_ids), CLASSIFY_SHARD_SIZE):
+            end = start + CLASSIFY_SHARD_SIZE
+            # work indices are ascending: bisect out this shard's slice of each
+            shard_work = {}
+            for theme, indices in work.items():
+                lo = bisect.bisect_left(indices, start)
+                hi = bisect.bisect_left(indices, end)
+                if lo < hi:
+                    shard_work[theme] = [i - start for i in indices[lo:hi]]
+            if shard_work:
+                yield tweet_ids[start:end], full_texts[start:end], shard_work
+
+    shards = shard_args()
+    # spawn, not fork: forking a process that already holds torch/OpenMP
+    # thread pools can deadlock the children
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_classify_worker,
+        initargs=(torch_threads,),
+    ) as executor:
+        pending = {
+            executor.submit(_score_shard, *args)
+            for args in itertools.islice(shards, 2 * workers)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                pending.update(
+                    executor.submit(_score_shard, *args)
+                    for args in itertools.islice(shards, 1)
+                )
+
+
+def iter_classified_batches(
+    tweets: list, themes: list, workers: int = 1, missing: dict = None
+):
+    """
+    Yields lists of classified rows as they become available, so callers can
+    store them while the next ones are being scored. With `missing` (see
+    fetch_unclassified_pairs) a tweet is only scored for the themes it has no
+    stored score for; without it, for every theme. With more than one worker
+    the model runs in worker processes (see _iter_sharded); meant for
+    multi-core CPUs, with one worker or on a GPU use a single process.
+    Extracting the texts, the keyword prefilter and all logging happen here,
+    once, whatever the number of workers.
+    """
+    tweet_ids, full_texts = _extract_texts(tweets)
+    logging.info(f"Classifying {len(full_texts)} tweets for themes {themes}")
+
+    work = {}
+    for theme in themes:
+        keywords = THEME_KEYWORDS.get(theme)
+        wanted = None if missing is None else missing.get(theme, set())
+        candidates, rejected = [], []
+        for i, full_text in enumerate(full_texts):
+            if wanted is not None and tweet_ids[i] not in wanted:
+                continue
+            if keywords is None or keywords.search(full_text):
+                candidates.append(i)
+            else:
+                rejected.append(i)
+        logging.info(
+            "Theme '%s': %d of %d tweets pass the keyword prefilter",
+            theme,
+            len(candidates),
+            len(candidates) + len(rejected),
+        )
+        # tweets the prefilter rules out never reach the model; they are
+        # recorded (see insert_classified_tweets) so later runs skip them
+        # until the pattern changes
+        for start in range(0, len(rejected), INSERT_CHUNK_SIZE):
+            yield [
+                {
+                    "tweet_id": tweet_ids[i],
+                    "theme_measured": theme,
+                    "keyword_pattern": keywords.pattern,
+                }
+                for i in rejected[start : start + INSERT_CHUNK_SIZE]
+            ]
+        if candidates:
+            work[theme] = candidates
+
+    total = sum(len(indices) for indices in work.values())
+    if not total:
+        return
+    if workers <= 1:
+        batches = _iter_scored(tweet_ids, full_texts, work)
+    else:
+        batches = _iter_sharded(tweet_ids, full_texts, work, workers)
+    scored = 0
+    for batch in batches:
+        yield batch
+        # %-args: the message is only formatted if a handler will emit it
+        if (scored + len(batch)) // 1000 != scored // 1000:
+            logging.info(
+                "Scored %d out of %d (tweet, theme) pairs.", scored + len(batch), total
+            )
+        scored += len(batch)
+
+
+def classify_tweets(tweets: list, themes: list, missing: dict = None) -> list:
+    return [
+        classified
+        for batch in iter_classified_batches(tweets, themes, missing=missing)
+        for classified in batch
+    ]
+
+
+def classify_and_save(
+    conn: sqlite3, tweets: list, themes: list, workers: int = 1
+) -> int:
+    """
+    Scores each tweet only against the themes it has no stored score for yet
+    from the current classifier (see classifier_name).
+    All scores are stored, not just those above the threshold, so that the
+    next run can skip them; apply the threshold when reading (see
+    fetch_tweets_for_theme).
+    """
+    model = classifier_name()
+    missing = fetch_unclassified_pairs(conn, tweets, themes, model)
+    missing_ids = set().union(*missing.values())
+    tweets_not_yet_classified = [
+        tw for tw in tweets if tw.get("tweet", {}).get("id", "") in missing_ids
+    ]
+    logging.info(
+        f"Number of tweets not yet classified: {len(tweets_not_yet_classified)} "
+        f"({sum(len(ids) for ids in missing.values())} (tweet, theme) pairs)"
+    )
+
+    # pipeline the two stages: this thread keeps the model busy while a writer
+    # thread commits finished chunks; the bounded queue caps rows held in memory
+    write_queue = queue.Queue(maxsize=4)
+    rows_inserted = 0
+    write_error = None
+
+    def write_chunks():
+        nonlocal rows_inserted, write_error
+        while (chunk := write_queue.get()) is not None:
+            # after a failure keep draining the queue (without writing), so
+            # the classifying thread never blocks on a full queue
+            if write_error is not None:
+                continue
+            try:
+                rows_inserted += insert_classified_tweets(conn, chunk, model)
+            except Exception as e:
+                write_error = e
+
+    writer = threading.Thread(target=write_chunks, name="scores-writer")
+    writer.start()
+    try:
+        chunk = []
+        for batch in iter_classified_batches(
+            tweets_not_yet_classified, themes, workers, missing
+        ):
+            # stop classifying as soon as nothing more can be stored
+            if write_error is not None:
+                break
+            chunk.extend(batch)
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                write_queue.put(chunk)
+                chunk = []
+        if chunk and write_error is None:
+            write_queue.put(chunk)
+    finally:
+        write_queue.put(None)
+        writer.join()
+    if write_error is not None:
+        raise write_error
     logging.info(f'Number of classified tweets inserted into database: [{rows_inserted}]')
     
     return rows_inserted
@@ -230,11 +802,17 @@ def main():
 
     # section: classify by topic
     # classify_topic(tweets)
-    # political = get_tweets_for_theme(conn, tweets, "political")
-    tweets_classified_and_inserted = classify_and_save(conn, tweets, Theme.ENTERTAINMENT.value)
+    tweets_classified_and_inserted = classify_and_save(
+        conn,
+        tweets,
+        [Theme.ENTERTAINMENT.value],
+        workers=int(os.getenv("CLASSIFY_WORKERS", "1")),
+    )
     logging.info(f'Number of tweets classified and inserted: {tweets_classified_and_inserted}')
-    # print(f"Length of political tweets: {len(political)}")
-    # print("First 5 political tweets:", political[:5])
+    # the threshold is applied here, on read: every score is stored
+    entertainment = fetch_tweets_for_theme(conn, Theme.ENTERTAINMENT.value)
+    print(f"Length of entertainment tweets: {len(entertainment)}")
+    print("First 5 entertainment tweets:", entertainment[:5])
 
     # section: get favorites / retweets
     # engagement = {}
@@ -259,5 +837,4 @@ def main():
 
 
 if __name__ == "__main__":
-    init()
     main()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# src/ is not a package: make `import main` resolve to src/main.py
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def scored(tmp_path, monkeypatch):
+    """
+    Runs the app in an empty directory with the model stubbed out; every
+    premise scores 0.9. Returns the list of (hypothesis, premise) pairs that
+    reached the "model".
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    for name in ("CLASSIFIER_MODEL", "CLASSIFIER_ONNX_DIR", "CLASSIFY_WORKERS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(main, "_get_classifier", lambda: (None, None, [0, 1]))
+
+    calls = []
+
+    def fake_entailment_scores(tokenizer, model, nli_label_ids, premises, hypothesis):
+        calls.extend((hypothesis, premise) for premise in premises)
+        return [0.9] * len(premises)
+
+    monkeypatch.setattr(main, "_entailment_scores", fake_entailment_scores)
+    return calls
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+
+import pytest
+
+import main
+
+
+def archive(*texts):
+    return [
+        {"tweet": {"id": str(i), "full_text": text}} for i, text in enumerate(texts)
+    ]
+
+
+def test_init_migrates_single_key_scores(scored):
+    legacy = sqlite3.connect(main.DB_PATH)
+    legacy.execute(
+        """
+        CREATE TABLE scores (
+            tweet_id TEXT PRIMARY KEY,
+            full_text TEXT NOT NULL,
+            theme TEXT NOT NULL,
+            score REAL NOT NULL
+        )
+        """
+    )
+    legacy.execute("CREATE INDEX idx_tweet_id ON scores (tweet_id)")
+    legacy.execute("CREATE INDEX idx_theme ON scores (theme)")
+    legacy.executemany(
+        "INSERT INTO scores VALUES (?, ?, ?, ?)",
+        [("1", "a movie", "entertainment", 0.8), ("2", "in Miami", "Miami", 0.6)],
+    )
+    legacy.commit()
+    legacy.close()
+
+    conn = main.init()
+    rows = conn.execute(
+        "SELECT tweet_id, full_text, theme, score, model FROM scores ORDER BY tweet_id"
+    ).fetchall()
+    assert rows == [
+        ("1", "a movie", "entertainment", 0.8, main.CLASSIFIER_MODEL_LEGACY),
+        ("2", "in Miami", "Miami", 0.6, main.CLASSIFIER_MODEL_LEGACY),
+    ]
+    key = sorted(
+        (row[5], row[1]) for row in conn.execute("PRAGMA table_info(scores)") if row[5]
+    )
+    assert [name for _, name in key] == ["tweet_id", "theme", "model"]
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert "scores_legacy" not in tables
+    assert conn.execute("SELECT row_count FROM meta").fetchone() == (2,)
+    main.terminate(conn)
+
+    # a second start finds the current layout and leaves the rows alone
+    conn = main.init()
+    assert conn.execute("SELECT COUNT(*) FROM scores").fetchone() == (2,)
+    main.terminate(conn)
+
+
+def test_classify_and_save_scores_only_missing_pairs(scored):
+    tweets = archive("movie night", "Miami beach", "hello world")
+    conn = main.init()
+
+    # Miami has a keyword pattern: only the Miami tweet reaches the model
+    assert main.classify_and_save(conn, tweets, ["entertainment", "Miami"]) == 6
+    assert len(scored) == 4
+
+    # nothing is missing, including the tweets the prefilter rejected
+    scored.clear()
+    assert main.classify_and_save(conn, tweets, ["entertainment", "Miami"]) == 0
+    assert scored == []
+
+    # a new theme scores that theme only
+    assert main.classify_and_save(conn, tweets, ["entertainment", "politics"]) == 3
+    assert {hypothesis for hypothesis, _ in scored} == {"This example is politics."}
+
+    # rejections are not scores
+    assert conn.execute("SELECT COUNT(*), MIN(score) FROM scores").fetchone() == (
+        7,
+        0.9,
+    )
+    main.terminate(conn)
+
+
+def test_classify_and_save_raises_when_writer_fails(scored, monkeypatch):
+    conn = main.init()
+    monkeypatch.setattr(main, "INSERT_CHUNK_SIZE", 1)
+
+    def failing_insert(conn, classified_tweets, model):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(main, "insert_classified_tweets", failing_insert)
+
+    errors = []
+
+    def run():
+        try:
+            main.classify_and_save(
+                conn, archive(*["movie night"] * 200), ["entertainment"]
+            )
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "classify_and_save hung after the writer failed"
+    assert [str(e) for e in errors] == ["disk full"]
+
+
+def test_classify_and_save_raises_on_locked_db(scored):
+    conn = main.init()
+    conn.execute("PRAGMA busy_timeout=0")
+    other = sqlite3.connect(main.DB_PATH)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            main.classify_and_save(conn, archive("movie night"), ["entertainment"])
+    finally:
+        other.rollback()
+        other.close()